@@ -0,0 +1,127 @@
+"""
+asyncio 版执行引擎：节点执行、等待、停止处理均为协程
+
+- 所有 AsyncFlowEngine 共享一个后台事件循环线程，一个进程可同时驱动大量流程
+- 节点与流程逻辑与 FlowEngine 共用（_node_ops / _flow_ops），这里只替换等待与阻塞调用的执行方式
+- 截屏/匹配、点击与失败转储是阻塞调用，放到线程池执行器中运行
+- stop() 直接取消运行中的任务，等待中的流程立即退出
+- 对外接口与 FlowEngine 相同（start/stop/is_running/edge_highlight_callback），MainWindow 可任选其一
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import Executor
+from typing import Callable, Optional
+
+from engine import FlowEngine
+from models import FlowModel, NodeModel
+
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def shared_loop() -> asyncio.AbstractEventLoop:
+    """返回（必要时启动）所有异步引擎共享的事件循环"""
+    global _loop
+    with _loop_lock:
+        if _loop is None or _loop.is_closed():
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="flow-asyncio", daemon=True).start()
+        return _loop
+
+
+class AsyncFlowEngine(FlowEngine):
+    def __init__(self, flow: FlowModel, log_callback: Optional[Callable[[str], None]] = None,
+                 executor: Optional[Executor] = None, **kwargs):
+        super().__init__(flow, log_callback=log_callback, **kwargs)
+        # None 表示使用事件循环的默认线程池
+        self._executor = executor
+        self._loop = None
+        self._task = None
+        # 任务真正结束（含取消后的清理）时才清除，避免新旧运行重叠
+        self._running = False
+        self._done = threading.Event()
+        self._done.set()
+
+    def start(self):
+        if self.is_running():
+            self.log("引擎已在运行")
+            return
+        self._stop.clear()
+        self._running = True
+        self._done.clear()
+        self._loop = shared_loop()
+        self._loop.call_soon_threadsafe(self._spawn)
+        self.log("引擎启动")
+
+    def _spawn(self):
+        # 在事件循环线程中执行
+        self._task = self._loop.create_task(self._run_async())
+        self._task.add_done_callback(self._on_task_done)
+
+    def _on_task_done(self, task):
+        self._running = False
+        self._done.set()
+
+    def _cancel_task(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+
+    def stop(self):
+        self._stop.set()
+        if self._loop is not None and self._running:
+            # 在事件循环线程中取消任务本身，任务收尾完成前 is_running() 仍为 True
+            self._loop.call_soon_threadsafe(self._cancel_task)
+        self.log("请求停止引擎")
+
+    def is_running(self):
+        return self._running
+
+    def join(self, timeout: Optional[float] = None):
+        self._done.wait(timeout)
+
+    async def _offload(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    async def _asleep(self, secs: float) -> bool:
+        if secs > 0:
+            await asyncio.sleep(secs)
+        return self._stop.is_set()
+
+    async def _adrive(self, ops):
+        """与 FlowEngine._drive 相同，只是等待与阻塞调用不占用事件循环"""
+        result, error = None, None
+        while True:
+            try:
+                op = ops.throw(error) if error is not None else ops.send(result)
+            except StopIteration as e:
+                return e.value
+            result, error = None, None
+            try:
+                if op[0] == "sleep":
+                    result = await self._asleep(op[1])
+                elif op[0] == "node":
+                    result = await self._aexecute_node_once(op[1])
+                else:
+                    result = await self._offload(op[1], *op[2:])
+            except asyncio.CancelledError:
+                ops.close()
+                raise
+            except Exception as e:
+                error = e
+
+    async def _aexecute_node_once(self, node: NodeModel):
+        return await self._adrive(self._node_ops(node))
+
+    async def _run_async(self):
+        try:
+            await self._adrive(self._flow_ops())
+        except asyncio.CancelledError:
+            self.log("检测到停止请求，退出节点执行")
+            raise
+        except Exception as e:
+            # 否则异常只会作为 "Task exception was never retrieved" 打印到 stderr
+            self.log("引擎异常:", repr(e))
+        finally:
+            self._log_prefilter_stats()
+            self.log("引擎结束")
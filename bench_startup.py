@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+启动时间基准：测量编辑器窗口出现耗时（time-to-window）与首次定位耗时（time-to-first-locate）
+
+每轮在全新子进程中运行，取中位数与预算比较，超出预算时返回码为 1。
+同时报告窗口出现时是否已加载 cv2 / pyautogui 等重量级模块（应为空，否则也视为超出预算）。
+
+用法：python bench_startup.py [--runs 5] [--template button.png] [--offscreen]
+                              [--window-budget 1.5] [--locate-budget 3.0]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+HEAVY_MODULES = ("cv2", "numpy", "pyautogui", "pyscreeze", "PIL")
+
+CHILD = r'''
+import json, sys, time
+t0 = time.perf_counter()
+from PySide6.QtWidgets import QApplication
+from gui_qt import MainWindow
+app = QApplication(sys.argv)
+win = MainWindow(); win.resize(1200, 780); win.show()
+app.processEvents()
+t1 = time.perf_counter()
+out = {"window": t1 - t0, "heavy": [m for m in HEAVY if m in sys.modules]}
+if TEMPLATE:
+    from engine import FlowEngine
+    from models import FlowModel
+    errors = []
+    FlowEngine(FlowModel(), log_callback=errors.append)._locate_center(TEMPLATE, None)
+    out["first_locate"] = time.perf_counter() - t1
+    if errors:
+        out["locate_errors"] = errors
+print("BENCH " + json.dumps(out))
+'''
+
+
+def run_once(template, offscreen):
+    env = dict(os.environ)
+    if offscreen:
+        env["QT_QPA_PLATFORM"] = "offscreen"
+    code = CHILD.replace("HEAVY", repr(HEAVY_MODULES)).replace("TEMPLATE", repr(template))
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-c", code], cwd=os.path.dirname(os.path.abspath(__file__)),
+                          env=env, capture_output=True, text=True)
+    wall = time.perf_counter() - start
+    for line in proc.stdout.splitlines():
+        if line.startswith("BENCH "):
+            res = json.loads(line[6:])
+            # 含解释器启动在内的端到端耗时（近似）
+            res["process_to_window"] = wall - res.get("first_locate", 0.0)
+            return res
+    raise RuntimeError(proc.stderr.strip() or "子进程没有输出结果")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="编辑器启动时间基准")
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--template", default="", help="用于首次定位的模板图像（留空则跳过首次定位测量）")
+    ap.add_argument("--offscreen", action="store_true", help="使用 Qt offscreen 平台（无显示器时）")
+    ap.add_argument("--window-budget", type=float, default=1.5, help="time-to-window 预算（秒）")
+    ap.add_argument("--locate-budget", type=float, default=3.0, help="time-to-first-locate 预算（秒）")
+    args = ap.parse_args(argv)
+
+    results = [run_once(os.path.abspath(args.template) if args.template else "", args.offscreen)
+               for _ in range(args.runs)]
+    ok = True
+    report = {}
+    for key, budget in (("window", args.window_budget), ("process_to_window", None),
+                        ("first_locate", args.locate_budget)):
+        values = [r[key] for r in results if key in r]
+        if not values:
+            continue
+        med = statistics.median(values)
+        over = budget is not None and med > budget
+        ok = ok and not over
+        report[key] = {"median": round(med, 4), "min": round(min(values), 4), "budget": budget, "over": over}
+    heavy = sorted({m for r in results for m in r["heavy"]})
+    report["heavy_at_window"] = heavy
+    ok = ok and not heavy
+    errors = sorted({e for r in results for e in r.get("locate_errors", [])})
+    if errors:
+        # 定位失败时的耗时没有参考价值
+        report["locate_errors"] = errors
+        ok = False
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
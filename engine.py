@@ -5,31 +5,115 @@
 修复：
 - 统一日志接口：内部使用 self.log(*parts) 将 parts 拼接为单个字符串后调用用户提供的 log_callback(str)
 - 保持 edge_highlight_callback(src,dst) 行为不变
+- 可选 step_callback(node_id, ok, secs)：每个节点执行完成后调用
+- 可选飞行记录器（recorder.FlightRecorder）：保留最近帧，失败时转储
+- 指标（metrics.MetricsRegistry）：命中/未命中、重试、失败动作计数与截屏/匹配/点击/步骤耗时直方图
+- 可选并行定位（matcher.TiledMatcher）：locate_workers>0 时分块并行匹配，search_monitors 时多显示器并行
+- pyautogui / pyscreeze / OpenCV 在首次截屏、点击或定位时才导入（见 _pyautogui/_pyscreeze/has_opencv），
+  导入本模块不会加载这些重量级后端
+- 可选预过滤（prefilter.py）：节点 prefilter 字段指定的廉价检查先排除不可能命中的帧，统计见 prefilter_stats
+- 锚点：节点可引用另一个节点作为锚点（anchor_id + offset_x/offset_y），锚点位置定位一次后缓存，
+  在锚点的 anchor_ttl 秒内且锚点区域画面未变化时，依赖节点无需任何匹配即可得到点击位置
+- 时钟 / 等待 / 截屏 / 点击集中到 _now/_sleep/_grab_frame/_grab_region/_click，子类（如 replay.ReplayEngine）可覆盖
 """
+import os
 import threading
 import time
-import pyautogui
+from functools import lru_cache
 from typing import Callable, Optional
 
-try:
-    import cv2  # noqa: F401
-    HAS_OPENCV = True
-except Exception:
-    HAS_OPENCV = False
+from filecache import FileCache
+from metrics import MetricsRegistry
+from models import FlowModel, NodeModel
 
-pyautogui.FAILSAFE = True
-pyautogui.PAUSE = 0.05
+# 锚点区域 16x16 灰度缩略图的平均差异超过该值（0-255）视为画面已变化
+ANCHOR_CHANGE_THRESHOLD = 12
+
+
+@lru_cache(maxsize=None)
+def _pyautogui():
+    # 无图形环境（如无头 Linux 上回放）时 pyautogui 无法导入；回放引擎不会调用到这里
+    import pyautogui
+    pyautogui.FAILSAFE = True
+    pyautogui.PAUSE = 0.05
+    return pyautogui
+
+
+@lru_cache(maxsize=None)
+def _pyscreeze():
+    import pyscreeze
+    return pyscreeze
+
+
+@lru_cache(maxsize=None)
+def has_opencv() -> bool:
+    try:
+        import cv2  # noqa: F401
+        return True
+    except Exception:
+        return False
+
+
+def _decode_needle(path: str):
+    from PIL import Image
+    img = Image.open(path)
+    img.load()
+    return img
+
+
+_needle_cache = FileCache(_decode_needle)
+
+
+def load_needle(path: str):
+    """解码模板图像并缓存（见 filecache），常驻进程中重复运行时无需再次解码"""
+    return _needle_cache.get(path)
+
+
+def warm_up(image_paths=()) -> list:
+    """预先加载截屏/点击/匹配后端并解码模板，返回失败信息列表"""
+    errors = []
+    for loader in (_pyautogui, _pyscreeze, has_opencv):
+        try:
+            loader()
+        except Exception as e:
+            errors.append(f"{loader.__name__}: {e!r}")
+    for path in image_paths:
+        try:
+            load_needle(path)
+        except Exception as e:
+            errors.append(f"{path}: {e!r}")
+    return errors
 
-from models import FlowModel, NodeModel
 
 class FlowEngine:
-    def __init__(self, flow: FlowModel, log_callback: Optional[Callable[[str], None]] = None):
+    def __init__(self, flow: FlowModel, log_callback: Optional[Callable[[str], None]] = None,
+                 flight_recorder=None, metrics: Optional[MetricsRegistry] = None,
+                 locate_workers: int = 0, search_monitors: bool = False, matcher=None):
         self.flow = flow
         # user-provided callback that accepts a single string
         self._log_callback = log_callback or (lambda s: None)
         self._stop = threading.Event()
         self._thread = None
         self.edge_highlight_callback = None
+        self.step_callback = None
+        self.prefilter_stats = {}
+        self._anchor_cache = {}
+        self._anchor_ids = set()
+        self._prefilter_warned = False
+        self.flight_recorder = flight_recorder
+        self._last_frame = None
+        self.metrics = metrics or MetricsRegistry()
+        self.search_monitors = search_monitors
+        self._matcher = matcher
+        # 只有自己创建的匹配器才由 close() 关闭；外部传入的（如常驻执行器共享的）保持可用
+        self._owns_matcher = False
+        if matcher is None and locate_workers > 0:
+            if has_opencv():
+                from matcher import TiledMatcher
+                self._matcher = TiledMatcher(locate_workers)
+                self._owns_matcher = True
+            else:
+                self.log("未安装 OpenCV，忽略 locate_workers，使用单线程定位")
 
     def log(self, *parts):
         """内部统一日志接口：把多个 parts 拼接为一个字符串后交给回调"""
@@ -59,70 +143,234 @@ class FlowEngine:
     def is_running(self):
         return bool(self._thread and self._thread.is_alive())
 
-    def _locate_center(self, image_path: str, conf: Optional[float]):
+    def join(self, timeout: Optional[float] = None):
+        """等待本次运行结束"""
+        if self._thread:
+            self._thread.join(timeout)
+
+    def close(self):
+        """释放引擎自己创建的资源（并行定位线程池）；引擎之后不应再运行"""
+        if self._owns_matcher and self._matcher is not None:
+            self._matcher.close()
+            self._matcher = None
+            self._owns_matcher = False
+
+    # ---- 可覆盖的环境接口 ----
+    def _now(self) -> float:
+        return time.monotonic()
+
+    def _sleep(self, secs: float) -> bool:
+        """等待 secs 秒（响应停止请求），返回 True 表示期间收到停止请求"""
+        return self._stop.wait(secs)
+
+    def _grab_frame(self):
+        return _pyautogui().screenshot()
+
+    def _grab_region(self, box):
+        """截取屏幕区域 box=(left, top, width, height)"""
+        return _pyautogui().screenshot(region=box)
+
+    def _click(self, x, y, double: bool):
+        if double:
+            _pyautogui().doubleClick(x, y)
+        else:
+            _pyautogui().click(x, y)
+
+    def _grab_regions(self):
+        """返回待搜索区域 [(帧, 左上角 x, 左上角 y), ...]"""
+        if self.search_monitors and self._matcher is not None:
+            regions = self._matcher.grab_monitors()
+            if regions:
+                return regions
+        return [(self._grab_frame(), 0, 0)]
+
+    def _match(self, image_path: str, conf: Optional[float], regions):
+        if self._matcher is not None:
+            return self._matcher.locate(image_path, regions, conf)
+        frame = regions[0][0]
+        ps = _pyscreeze()
+        try:
+            needle = load_needle(image_path)
+            if conf is not None and has_opencv():
+                box = ps.locate(needle, frame, confidence=conf)
+            else:
+                box = ps.locate(needle, frame)
+        except ps.ImageNotFoundException:
+            return None
+        return ps.center(box) if box else None
+
+    def _prefilter(self, node: NodeModel, regions):
+        """按节点配置的预过滤检查各区域，返回未被拒绝的区域"""
+        if not has_opencv():
+            if not self._prefilter_warned:
+                self._prefilter_warned = True
+                self.log("未安装 OpenCV，预过滤已跳过")
+            return regions
+        from prefilter import check_frame, parse_stages
         try:
-            if conf is not None and HAS_OPENCV:
-                return pyautogui.locateCenterOnScreen(image_path, confidence=conf)
+            stages = parse_stages(node.prefilter, node.confidence)
+        except ValueError as e:
+            if node.id not in self.prefilter_stats:
+                self.log(f"[{node.label}]", str(e))
+            stages = []
+        stats = self.prefilter_stats.setdefault(node.id, {"label": node.label, "checked": 0, "passed": 0, "rejected": {}})
+        node_labels = (("node", node.label), ("node_id", node.id))
+        kept = []
+        for region in regions:
+            stage = check_frame(node.image_path, region[0], stages) if stages else None
+            stats["checked"] += 1
+            if stage is None:
+                stats["passed"] += 1
+                kept.append(region)
+                self.metrics.inc("prefilter", node_labels + (("result", "pass"),))
             else:
-                return pyautogui.locateCenterOnScreen(image_path)
+                stats["rejected"][stage] = stats["rejected"].get(stage, 0) + 1
+                self.metrics.inc("prefilter", node_labels + (("result", "reject"), ("stage", stage)))
+        return kept
+
+    def _log_prefilter_stats(self):
+        for stats in self.prefilter_stats.values():
+            checked = stats["checked"]
+            rejected = checked - stats["passed"]
+            by_stage = " ".join(f"{k}={v}" for k, v in stats["rejected"].items())
+            self.log(f"预过滤 [{stats['label']}] 检查 {checked} 次，拒绝 {rejected} 次"
+                     f"（{100.0 * rejected / checked if checked else 0:.1f}%）", by_stage)
+
+    def _locate_center(self, image_path: str, conf: Optional[float], node: Optional[NodeModel] = None):
+        t0 = time.perf_counter()
+        try:
+            regions = self._grab_regions()
+            self._last_frame = regions[0][0]
+            t1 = time.perf_counter()
+            self.metrics.observe("capture", t1 - t0)
+            if node is not None and node.prefilter:
+                regions = self._prefilter(node, regions)
+                t2 = time.perf_counter()
+                self.metrics.observe("prefilter", t2 - t1)
+                t1 = t2
+                if not regions:
+                    return None
+            try:
+                return self._match(image_path, conf, regions)
+            finally:
+                self.metrics.observe("match", time.perf_counter() - t1)
         except Exception as e:
             self.log("locate 异常:", repr(e))
             return None
 
-    def _execute_node_once(self, node: NodeModel):
+    # ---- 锚点 ----
+    def _anchor_signature(self, anchor: NodeModel, pos):
+        """锚点所在区域的缩略灰度图，用于判断画面是否变化"""
+        w, h = load_needle(anchor.image_path).size
+        box = (int(pos[0]) - w // 2, int(pos[1]) - h // 2, w, h)
+        return box, self._grab_region(box).convert("L").resize((16, 16))
+
+    def _anchor_changed(self, anchor: NodeModel, box, signature) -> bool:
+        from PIL import ImageChops, ImageStat
+        current = self._grab_region(box).convert("L").resize((16, 16))
+        diff = ImageStat.Stat(ImageChops.difference(current, signature)).mean[0]
+        return diff > ANCHOR_CHANGE_THRESHOLD
+
+    def _cache_anchor(self, anchor: NodeModel, pos):
+        if anchor.anchor_ttl <= 0:
+            return
+        try:
+            box, signature = self._anchor_signature(anchor, pos)
+        except Exception as e:
+            self.log("锚点截图异常:", repr(e))
+            return
+        self._anchor_cache[anchor.id] = (pos, self._now(), box, signature)
+
+    def _anchor_position(self, anchor: NodeModel):
+        cached = self._anchor_cache.get(anchor.id)
+        if cached is not None:
+            pos, t, box, signature = cached
+            try:
+                valid = (self._now() - t <= anchor.anchor_ttl
+                         and not self._anchor_changed(anchor, box, signature))
+            except Exception as e:
+                self.log("锚点校验异常:", repr(e))
+                valid = False
+            if valid:
+                self.metrics.inc("anchor", (("result", "cached"),))
+                return pos
+            self._anchor_cache.pop(anchor.id, None)
+        pos = self._locate_center(anchor.image_path, anchor.confidence, anchor)
+        self.metrics.inc("anchor", (("result", "located" if pos else "miss"),))
+        if pos:
+            self._cache_anchor(anchor, pos)
+        return pos
+
+    def _resolve_target(self, node: NodeModel, conf: Optional[float]):
+        """返回节点的点击位置：锚点节点按 锚点位置 + 偏移 计算，其它节点直接定位"""
+        if node.anchor_id:
+            anchor = self.flow.nodes.get(node.anchor_id)
+            if anchor is None or anchor.id == node.id:
+                self.log(f"[{node.label}] 锚点不存在:", node.anchor_id)
+                return None
+            if anchor.anchor_id:
+                # 不支持锚点链：锚点必须按自身图像定位
+                self.log(f"[{node.label}] 锚点节点本身引用了锚点:", anchor.label)
+                return None
+            pos = self._anchor_position(anchor)
+            if not pos:
+                return None
+            return int(pos[0]) + node.offset_x, int(pos[1]) + node.offset_y
+        pos = self._locate_center(node.image_path, conf, node)
+        if pos and node.id in self._anchor_ids:
+            # 被引用为锚点的节点自己执行时，顺便刷新锚点缓存
+            self._cache_anchor(node, pos)
+        return pos
+
+    def _reset_run_state(self):
+        self._anchor_cache.clear()
+        self._anchor_ids = {n.anchor_id for n in self.flow.nodes.values() if n.anchor_id}
+
+    # ---- 执行逻辑 ----
+    # 节点与流程逻辑写成生成器，只产出需要等待的操作，由驱动方执行后把结果 send 回来：
+    #   ("sleep", 秒)          等待（同步版 _sleep，异步版 asyncio.sleep）
+    #   ("call", 函数, *参数)   阻塞调用（定位、点击、转储；异步版放到线程池执行）
+    #   ("node", 节点)          执行一个节点（同步版 _execute_node_once，异步版 _aexecute_node_once）
+    # 操作抛出的异常会被 throw 回生成器。同步引擎与 AsyncFlowEngine 共用同一份逻辑。
+
+    def _node_ops(self, node: NodeModel):
         attempts = 0
         unlimited = (node.retries < 0)
         conf = node.confidence
+        node_labels = (("node", node.label), ("node_id", node.id))
         while unlimited or attempts < node.retries:
             if self._stop.is_set():
                 self.log("检测到停止请求，退出节点执行")
                 return False
             attempts += 1
+            if attempts > 1:
+                self.metrics.inc("retries", node_labels)
             self.log(f"[{node.label}] 尝试", attempts)
-            pos = self._locate_center(node.image_path, conf)
+            pos = yield ("call", self._resolve_target, node, conf)
+            self._record_attempt(node, attempts, pos)
+            self.metrics.inc("locate", node_labels + (("result", "hit" if pos else "miss"),))
             if pos:
                 x,y = pos
                 try:
                     for i in range(node.clicks):
-                        if node.double_click:
-                            pyautogui.doubleClick(x,y)
-                        else:
-                            pyautogui.click(x,y)
-                        time.sleep(0.08)
+                        t0 = time.perf_counter()
+                        yield ("call", self._click, x, y, node.double_click)
+                        self.metrics.observe("click", time.perf_counter() - t0)
+                        yield ("sleep", 0.08)
                     # post wait (响应停止请求)
-                    total = 0.0
-                    while total < node.post_wait:
-                        if self._stop.is_set():
-                            break
-                        time.sleep(0.1)
-                        total += 0.1
+                    yield ("sleep", node.post_wait)
                     return True
                 except Exception as e:
                     self.log("点击异常:", repr(e))
                     return False
             else:
                 # wait but be responsive to stop
-                total = 0.0
-                while total < node.wait_secs:
-                    if self._stop.is_set():
-                        break
-                    time.sleep(0.1)
-                    total += 0.1
+                yield ("sleep", node.wait_secs)
         self.log(f"[{node.label}] 重试耗尽")
         return False
 
-    def _choose_start_node(self):
-        for nid, n in self.flow.nodes.items():
-            if n.is_start:
-                return nid
-        # fallback by x coordinate
-        left = None; minx = None
-        for nid,n in self.flow.nodes.items():
-            if minx is None or n.x < minx:
-                minx = n.x; left = nid
-        return left
-
-    def _run(self):
+    def _flow_ops(self):
+        self._reset_run_state()
         current = self._choose_start_node()
         if current is None:
             self.log("没有起始节点")
@@ -134,40 +382,120 @@ class FlowEngine:
                 self.log("节点不存在:", current)
                 break
             self.log("执行节点:", node.label)
-            ok = self._execute_node_once(node)
-            if ok:
-                prev.append(current)
-                outs = self.flow.edges.get(current, [])
-                if outs:
-                    nxt = outs[0]
+            t0 = time.perf_counter()
+            ok = yield ("node", node)
+            self._emit_step(node, ok, time.perf_counter() - t0)
+            # 失败时可能转储飞行记录（写盘），按阻塞调用处理
+            current, delay = yield ("call", self._advance, current, node, ok, prev)
+            if delay:
+                yield ("sleep", delay)
+
+    def _drive(self, ops):
+        """同步执行 ops 生成器产出的操作，返回生成器的返回值"""
+        result, error = None, None
+        while True:
+            try:
+                op = ops.throw(error) if error is not None else ops.send(result)
+            except StopIteration as e:
+                return e.value
+            result, error = None, None
+            try:
+                if op[0] == "sleep":
+                    result = self._sleep(op[1])
+                elif op[0] == "node":
+                    result = self._execute_node_once(op[1])
                 else:
-                    nxt = None
-                # call edge highlight if exists
-                if nxt and callable(getattr(self, "edge_highlight_callback", None)):
-                    try:
-                        self.edge_highlight_callback(current, nxt)
-                    except Exception as e:
-                        self.log("edge_highlight_callback 异常:", repr(e))
-                current = nxt
-                continue
+                    result = op[1](*op[2:])
+            except Exception as e:
+                error = e
+
+    def _execute_node_once(self, node: NodeModel):
+        return self._drive(self._node_ops(node))
+
+    def _record_attempt(self, node: NodeModel, attempt: int, pos):
+        frame, self._last_frame = self._last_frame, None
+        if self.flight_recorder is None:
+            return
+        self.flight_recorder.submit(frame, {
+            "node": node.id, "label": node.label, "attempt": attempt,
+            "image_path": node.image_path, "pos": [int(pos[0]), int(pos[1])] if pos else None,
+        })
+
+    def dump_flight_record(self, reason: str = "manual"):
+        """把飞行记录器中的最近帧写盘，返回目录（未启用或无帧时返回 None）"""
+        if self.flight_recorder is None:
+            return None
+        try:
+            path = self.flight_recorder.dump(reason)
+        except Exception as e:
+            self.log("飞行记录转储异常:", repr(e))
+            return None
+        if path:
+            self.log("飞行记录已转储:", path)
+        return path
+
+    def _dump_on_fail(self):
+        # 停止请求导致的失败不算真正失败
+        if not self._stop.is_set():
+            self.dump_flight_record("fail")
+
+    def _choose_start_node(self):
+        for nid, n in self.flow.nodes.items():
+            if n.is_start:
+                return nid
+        # fallback by x coordinate
+        left = None; minx = None
+        for nid,n in self.flow.nodes.items():
+            if minx is None or n.x < minx:
+                minx = n.x; left = nid
+        return left
+
+    def _emit_step(self, node: NodeModel, ok: bool, secs: float):
+        self.metrics.observe("step", secs)
+        if callable(self.step_callback):
+            try:
+                self.step_callback(node.id, ok, secs)
+            except Exception as e:
+                self.log("step_callback 异常:", repr(e))
+
+    def _advance(self, current: str, node: NodeModel, ok: bool, prev: list):
+        """根据节点结果决定下一节点，返回 (下一节点 id 或 None, 进入前需等待的秒数)"""
+        if ok:
+            prev.append(current)
+            outs = self.flow.edges.get(current, [])
+            if outs:
+                nxt = outs[0]
             else:
-                action = node.on_fail
-                self.log("节点失败 action=", action)
-                if action == "stop":
-                    break
-                elif action == "retry":
-                    time.sleep(0.3)
-                    continue
-                elif action == "rollback":
-                    if prev:
-                        current = prev.pop()
-                        continue
-                    else:
-                        break
-                elif action == "skip":
-                    outs = self.flow.edges.get(current, [])
-                    current = outs[0] if outs else None
-                    continue
-                else:
-                    break
-        self.log("引擎结束")
\ No newline at end of file
+                nxt = None
+            # call edge highlight if exists
+            if nxt and callable(getattr(self, "edge_highlight_callback", None)):
+                try:
+                    self.edge_highlight_callback(current, nxt)
+                except Exception as e:
+                    self.log("edge_highlight_callback 异常:", repr(e))
+            return nxt, 0.0
+        action = node.on_fail
+        self.log("节点失败 action=", action)
+        if not self._stop.is_set():
+            self.metrics.inc("on_fail", (("action", action),))
+        if action == "stop":
+            self._dump_on_fail()
+            return None, 0.0
+        elif action == "retry":
+            return current, 0.3
+        elif action == "rollback":
+            if prev:
+                self.metrics.inc("rollbacks")
+                return prev.pop(), 0.0
+            self._dump_on_fail()
+            return None, 0.0
+        elif action == "skip":
+            outs = self.flow.edges.get(current, [])
+            return (outs[0] if outs else None), 0.0
+        self._dump_on_fail()
+        return None, 0.0
+
+    def _run(self):
+        self._drive(self._flow_ops())
+        self._log_prefilter_stats()
+        self.log("引擎结束")
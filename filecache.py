@@ -0,0 +1,41 @@
+"""
+按文件路径缓存解码结果（模板图像、灰度数组、预过滤特征等）
+
+- 文件修改时间变化后重新加载，并替换该路径的旧条目
+- 路径数超过 maxsize 时淘汰最久未使用的路径，常驻进程执行任意多的流程时内存也有上限
+"""
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable
+
+
+class FileCache:
+    def __init__(self, loader: Callable[[str], Any], maxsize: int = 256):
+        self._loader = loader
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path: str):
+        mtime = os.path.getmtime(path)
+        with self._lock:
+            cached = self._data.get(path)
+            if cached is not None and cached[0] == mtime:
+                self._data.move_to_end(path)
+                return cached[1]
+        # 解码在锁外进行，不阻塞其它路径的命中
+        value = self._loader(path)
+        with self._lock:
+            self._data[path] = (mtime, value)
+            self._data.move_to_end(path)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
@@ -3,6 +3,7 @@
 PySide6 GUI（暗黑 / neon 主题）重写（替换原 gui_qt.py）
 - 包含改进：连线/节点可选中并删除（Delete 键/右键菜单）
 - Edge 动画与 engine 回调集成
+- 引擎模块在首次“开始执行”时才导入，打开编辑器不会加载 OpenCV / pyautogui
 """
 
 from PySide6.QtGui import QAction
@@ -17,12 +18,15 @@ from PySide6.QtCore import Qt, QRectF, QPointF, QTimer, QEvent
 
 from models import FlowModel, make_default_node
 from utils import ask_image_file, save_flow_file, open_flow_file, write_to_qtextedit, show_info, show_error
-from engine import FlowEngine
 
 NODE_W = 160
 NODE_H = 64
 PORT_R = 7
 
+# 多选时各节点取值不同的字段显示为
+MIXED_TEXT = "<多个值>"
+MIXED = object()
+
 # ---------- Dark neon stylesheet ----------
 DARK_QSS = """
 QWidget {
@@ -242,6 +246,18 @@ class EdgeItem(QGraphicsPathItem):
         self.update()
 
 
+class LazyComboBox(QComboBox):
+    """下拉列表在弹出时才由 populate 回调填充，切换选中节点时不必重建整个列表"""
+
+    def __init__(self, populate, parent=None):
+        super().__init__(parent)
+        self._populate = populate
+
+    def showPopup(self):
+        self._populate()
+        super().showPopup()
+
+
 # ---------- MainWindow ----------
 class MainWindow(QMainWindow):
     def __init__(self):
@@ -280,6 +296,8 @@ class MainWindow(QMainWindow):
         btn_stop = QPushButton("停止执行"); btn_stop.clicked.connect(self.stop_engine)
         rightlay.addWidget(btn_add); rightlay.addWidget(btn_save); rightlay.addWidget(btn_load)
         rightlay.addWidget(btn_start); rightlay.addWidget(btn_stop)
+        self.ck_async_engine = QCheckBox("使用 asyncio 引擎")
+        rightlay.addWidget(self.ck_async_engine)
 
         self.form_label = QLabel("节点属性")
         rightlay.addWidget(self.form_label)
@@ -288,6 +306,14 @@ class MainWindow(QMainWindow):
         rightlay.addWidget(self.prop_widget)
 
         self.current_node_item = None
+        self.selected_node_items = []
+        self._dirty = set()
+        self._binding = False
+        self._build_property_form()
+        self._rebind_timer = QTimer(self)
+        self._rebind_timer.setSingleShot(True)
+        self._rebind_timer.setInterval(0)
+        self._rebind_timer.timeout.connect(self.update_properties_for_selection)
 
         self.log = QTextEdit(); self.log.setReadOnly(True)
         rightlay.addWidget(QLabel("日志")); rightlay.addWidget(self.log)
@@ -394,12 +420,14 @@ class MainWindow(QMainWindow):
 
     def delete_node(self, node_item):
         nid = node_item.model.id
-        for (s,d), e in list(self.edge_items.items()):
-            if s == nid or d == nid:
+        # 只访问与该节点相连的连线，而不是扫描全部连线
+        keys = [(nid, d) for d in self.flow.edges.get(nid, [])] + [(p, nid) for p in self.flow.predecessors(nid)]
+        for key in keys:
+            e = self.edge_items.pop(key, None)
+            if e is not None:
                 try: self.scene.removeItem(e)
                 except: pass
-                self.flow.remove_edge(s, d)
-                del self.edge_items[(s,d)]
+            self.flow.remove_edge(*key)
         try: self.scene.removeItem(node_item)
         except: pass
         self.flow.remove_node(nid)
@@ -486,75 +514,228 @@ class MainWindow(QMainWindow):
 
     # selection -> properties
     def on_selection_changed(self):
-        items = self.scene.selectedItems()
-        node_item = None
-        for it in items:
-            if isinstance(it, QGraphicsRectItem) and hasattr(it, "model"):
-                node_item = it; break
-            # check parent item
-            try:
-                p = it.parentItem()
-            except Exception:
-                p = None
-            if p is not None and isinstance(p, QGraphicsRectItem) and hasattr(p, "model"):
-                node_item = p; break
-        self.current_node_item = node_item
-        self.update_properties_for_selection()
-
-    def _clear_form_layout(self):
-        while self.prop_form.count():
-            item = self.prop_form.takeAt(0)
-            widget = item.widget()
-            if widget is not None:
-                widget.deleteLater()
-
-    def update_properties_for_selection(self):
-        self._clear_form_layout()
-        if not self.current_node_item:
-            self.prop_form.addRow(QLabel("未选中节点"))
-            return
+        # 橡皮筋框选时 selectionChanged 会连续触发，合并到下一次事件循环再重新绑定
+        self._rebind_timer.start()
 
-        node = self.current_node_item.model
-
-        self.le_label = QLineEdit(node.label)
+    def _selected_node_items(self):
+        result = []
+        seen = set()
+        for it in self.scene.selectedItems():
+            node_item = None
+            if isinstance(it, QGraphicsRectItem) and hasattr(it, "model"):
+                node_item = it
+            else:
+                # check parent item
+                try:
+                    p = it.parentItem()
+                except Exception:
+                    p = None
+                if p is not None and isinstance(p, QGraphicsRectItem) and hasattr(p, "model"):
+                    node_item = p
+            if node_item is not None and id(node_item) not in seen:
+                seen.add(id(node_item))
+                result.append(node_item)
+        return result
+
+    def _build_property_form(self):
+        """属性面板只创建一次，之后随选择重新绑定"""
+        self.lb_selection = QLabel("未选中节点")
+        self.prop_form.addRow(self.lb_selection)
+
+        self.le_label = QLineEdit()
+        self.le_label.textEdited.connect(lambda _: self._mark_dirty("label"))
         self.prop_form.addRow("标签:", self.le_label)
 
         hbox = QHBoxLayout()
-        self.le_image = QLineEdit(node.image_path or "")
+        self.le_image = QLineEdit()
+        self.le_image.textEdited.connect(lambda _: self._mark_dirty("image_path"))
         btn_img = QPushButton("选择")
         btn_img.clicked.connect(self.choose_image_for_current)
         hbox.addWidget(self.le_image); hbox.addWidget(btn_img)
         container = QWidget(); container.setLayout(hbox)
         self.prop_form.addRow("图像路径:", container)
 
-        self.sb_retries = QSpinBox(); self.sb_retries.setRange(-1, 9999); self.sb_retries.setValue(int(node.retries))
+        self.sb_retries = QSpinBox(); self.sb_retries.setRange(-1, 9999)
+        self.sb_retries.valueChanged.connect(lambda _: self._mark_dirty("retries"))
         self.prop_form.addRow("重试 (-1 无限):", self.sb_retries)
 
-        self.ds_wait = QDoubleSpinBox(); self.ds_wait.setRange(0.0, 9999.0); self.ds_wait.setDecimals(2); self.ds_wait.setValue(float(node.wait_secs))
+        self.ds_wait = QDoubleSpinBox(); self.ds_wait.setRange(0.0, 9999.0); self.ds_wait.setDecimals(2)
+        self.ds_wait.valueChanged.connect(lambda _: self._mark_dirty("wait_secs"))
         self.prop_form.addRow("等待 (s):", self.ds_wait)
 
-        self.sb_clicks = QSpinBox(); self.sb_clicks.setRange(1, 99); self.sb_clicks.setValue(int(node.clicks))
+        self.sb_clicks = QSpinBox(); self.sb_clicks.setRange(1, 99)
+        self.sb_clicks.valueChanged.connect(lambda _: self._mark_dirty("clicks"))
         self.prop_form.addRow("点击次数:", self.sb_clicks)
 
-        self.ck_double = QCheckBox(); self.ck_double.setChecked(bool(node.double_click))
+        self.ck_double = QCheckBox()
+        self.ck_double.clicked.connect(lambda _: self._check_clicked(self.ck_double, "double_click"))
         self.prop_form.addRow("双击:", self.ck_double)
 
-        self.ds_post = QDoubleSpinBox(); self.ds_post.setRange(0.0, 9999.0); self.ds_post.setDecimals(2); self.ds_post.setValue(float(node.post_wait))
+        self.ds_post = QDoubleSpinBox(); self.ds_post.setRange(0.0, 9999.0); self.ds_post.setDecimals(2)
+        self.ds_post.valueChanged.connect(lambda _: self._mark_dirty("post_wait"))
         self.prop_form.addRow("点击后暂停 (s):", self.ds_post)
 
-        self.le_conf = QLineEdit("" if node.confidence is None else str(node.confidence))
+        self.le_conf = QLineEdit()
+        self.le_conf.textEdited.connect(lambda _: self._mark_dirty("confidence"))
         self.prop_form.addRow("匹配置信度 (0-1):", self.le_conf)
 
+        self.cb_anchor = LazyComboBox(self._populate_anchor_choices); self.cb_anchor.setPlaceholderText(MIXED_TEXT)
+        self.cb_anchor.setToolTip("选择锚点后按 锚点位置 + 偏移 点击，不再匹配本节点图像")
+        self.cb_anchor.activated.connect(lambda _: self._mark_dirty("anchor_id"))
+        self.prop_form.addRow("锚点节点:", self.cb_anchor)
+
+        self.sb_offset_x = QSpinBox(); self.sb_offset_x.setRange(-9999, 9999)
+        self.sb_offset_x.valueChanged.connect(lambda _: self._mark_dirty("offset_x"))
+        self.prop_form.addRow("锚点偏移 X:", self.sb_offset_x)
+
+        self.sb_offset_y = QSpinBox(); self.sb_offset_y.setRange(-9999, 9999)
+        self.sb_offset_y.valueChanged.connect(lambda _: self._mark_dirty("offset_y"))
+        self.prop_form.addRow("锚点偏移 Y:", self.sb_offset_y)
+
+        self.ds_anchor_ttl = QDoubleSpinBox(); self.ds_anchor_ttl.setRange(0.0, 9999.0); self.ds_anchor_ttl.setDecimals(2)
+        self.ds_anchor_ttl.setToolTip("本节点作为锚点时位置缓存的有效期，0 表示不缓存")
+        self.ds_anchor_ttl.valueChanged.connect(lambda _: self._mark_dirty("anchor_ttl"))
+        self.prop_form.addRow("作为锚点缓存 (s):", self.ds_anchor_ttl)
+
+        self.le_prefilter = QLineEdit(); self.le_prefilter.setToolTip("逗号分隔：color, coarse, edges")
+        self.le_prefilter.textEdited.connect(lambda _: self._mark_dirty("prefilter"))
+        self.prop_form.addRow("预过滤:", self.le_prefilter)
+
         self.cb_onfail = QComboBox(); self.cb_onfail.addItems(["stop", "retry", "rollback", "skip"])
-        idx = self.cb_onfail.findText(node.on_fail)
-        if idx >= 0: self.cb_onfail.setCurrentIndex(idx)
+        self.cb_onfail.setPlaceholderText(MIXED_TEXT)
+        self.cb_onfail.activated.connect(lambda _: self._mark_dirty("on_fail"))
         self.prop_form.addRow("失败时动作:", self.cb_onfail)
 
-        self.ck_start = QCheckBox(); self.ck_start.setChecked(bool(node.is_start))
+        self.ck_start = QCheckBox()
+        self.ck_start.clicked.connect(lambda _: self._check_clicked(self.ck_start, "is_start"))
         self.prop_form.addRow("标记为起始节点:", self.ck_start)
 
-        btn_apply = QPushButton("应用到节点"); btn_apply.clicked.connect(self.apply_properties_to_current)
-        self.prop_form.addRow(btn_apply)
+        self.btn_apply = QPushButton("应用到节点"); self.btn_apply.clicked.connect(self.apply_properties_to_current)
+        self.prop_form.addRow(self.btn_apply)
+
+        # 每个字段对应的 (最小值, 控件)，用于显示“多个值”
+        self._spin_fields = {
+            "retries": (-1, self.sb_retries),
+            "wait_secs": (0.0, self.ds_wait),
+            "clicks": (1, self.sb_clicks),
+            "post_wait": (0.0, self.ds_post),
+            "offset_x": (-9999, self.sb_offset_x),
+            "offset_y": (-9999, self.sb_offset_y),
+            "anchor_ttl": (0.0, self.ds_anchor_ttl),
+        }
+
+    def _mark_dirty(self, field_name):
+        if not self._binding:
+            self._dirty.add(field_name)
+
+    def _check_clicked(self, box, field_name):
+        # 用户点击后不再允许回到“部分选中”
+        box.setTristate(False)
+        self._mark_dirty(field_name)
+
+    @staticmethod
+    def _common_value(nodes, field_name):
+        first = getattr(nodes[0], field_name)
+        for n in nodes[1:]:
+            if getattr(n, field_name) != first:
+                return MIXED
+        return first
+
+    def _bind_spin(self, field_name, value):
+        lo, box = self._spin_fields[field_name]
+        if value is MIXED:
+            # 在最小值下方留出一格作为“多个值”的特殊值
+            box.setMinimum(lo - 1)
+            box.setSpecialValueText(MIXED_TEXT)
+            box.setValue(box.minimum())
+        else:
+            box.setSpecialValueText("")
+            box.setMinimum(lo)
+            box.setValue(value)
+
+    def _bind_line(self, edit, value, fmt=str):
+        if value is MIXED:
+            edit.setText(""); edit.setPlaceholderText(MIXED_TEXT)
+        else:
+            edit.setText("" if value is None else fmt(value)); edit.setPlaceholderText("")
+
+    def _bind_check(self, box, value):
+        if value is MIXED:
+            box.setTristate(True); box.setCheckState(Qt.PartiallyChecked)
+        else:
+            box.setTristate(False); box.setChecked(bool(value))
+
+    def _anchor_item(self, anchor_id):
+        n = self.flow.nodes.get(anchor_id)
+        # 锚点节点已被删除时仍显示原 id
+        return (n.label if n else f"<缺失> {anchor_id}"), anchor_id
+
+    def _bind_anchor(self, value):
+        # 只放入当前值，完整候选列表在下拉弹出时再填充
+        self.cb_anchor.clear()
+        self.cb_anchor.addItem("（无）", "")
+        if value is MIXED:
+            self.cb_anchor.setCurrentIndex(-1)
+        elif value:
+            self.cb_anchor.addItem(*self._anchor_item(value))
+            self.cb_anchor.setCurrentIndex(1)
+        else:
+            self.cb_anchor.setCurrentIndex(0)
+
+    def _populate_anchor_choices(self):
+        """候选锚点：未选中且自身不引用锚点的节点（不支持锚点链）"""
+        box = self.cb_anchor
+        current = box.currentData() if box.currentIndex() >= 0 else None
+        selected = {it.model.id for it in self.selected_node_items}
+        box.clear()
+        box.addItem("（无）", "")
+        for nid, n in self.flow.nodes.items():
+            if nid not in selected and not n.anchor_id:
+                box.addItem(n.label, nid)
+        if current is None:
+            box.setCurrentIndex(-1)
+            return
+        idx = box.findData(current)
+        if idx < 0:
+            box.addItem(*self._anchor_item(current))
+            idx = box.count() - 1
+        box.setCurrentIndex(idx)
+
+    def update_properties_for_selection(self):
+        self.selected_node_items = self._selected_node_items()
+        self.current_node_item = self.selected_node_items[0] if self.selected_node_items else None
+        nodes = [it.model for it in self.selected_node_items]
+        self._binding = True
+        try:
+            self._dirty.clear()
+            for i in range(self.prop_form.rowCount()):
+                if i > 0:
+                    self.prop_form.setRowVisible(i, bool(nodes))
+            if not nodes:
+                self.lb_selection.setText("未选中节点")
+                self.lb_selection.setVisible(True)
+                return
+            bulk = len(nodes) > 1
+            self.lb_selection.setText(f"批量编辑 {len(nodes)} 个节点（只应用修改过的字段）" if bulk else "")
+            self.lb_selection.setVisible(bulk)
+            self.btn_apply.setText(f"应用到 {len(nodes)} 个节点" if bulk else "应用到节点")
+            # 起始节点只能有一个，批量模式下不允许修改
+            self.ck_start.setEnabled(not bulk)
+
+            value = lambda f: self._common_value(nodes, f)
+            self._bind_line(self.le_label, value("label"))
+            self._bind_line(self.le_image, value("image_path"))
+            for f in self._spin_fields:
+                self._bind_spin(f, value(f))
+            self._bind_check(self.ck_double, value("double_click"))
+            self._bind_line(self.le_conf, value("confidence"))
+            self._bind_line(self.le_prefilter, value("prefilter"))
+            self._bind_anchor(value("anchor_id"))
+            on_fail = value("on_fail")
+            self.cb_onfail.setCurrentIndex(-1 if on_fail is MIXED else self.cb_onfail.findText(on_fail))
+            self._bind_check(self.ck_start, value("is_start"))
+        finally:
+            self._binding = False
 
     def choose_image_for_current(self):
         if not self.current_node_item:
@@ -562,35 +743,60 @@ class MainWindow(QMainWindow):
             return
         path = ask_image_file(self)
         if path:
-            self.le_image.setText(path); self.current_node_item.model.image_path = path
+            self.le_image.setText(path)
+            if len(self.selected_node_items) == 1:
+                self.current_node_item.model.image_path = path
+            else:
+                self._mark_dirty("image_path")
+
+    def _collect_changes(self):
+        """从已修改的字段收集 字段名 -> 新值；无效输入的字段被忽略"""
+        changes = {}
+        d = self._dirty
+        if "label" in d and self.le_label.text():
+            changes["label"] = self.le_label.text()
+        if "image_path" in d and self.le_image.text():
+            changes["image_path"] = self.le_image.text()
+        for f, (lo, box) in self._spin_fields.items():
+            if f in d and box.value() >= lo:
+                changes[f] = type(lo)(box.value())
+        if "double_click" in d:
+            changes["double_click"] = self.ck_double.isChecked()
+        if "confidence" in d:
+            conf_text = self.le_conf.text().strip()
+            if conf_text == "":
+                changes["confidence"] = None
+            else:
+                try: changes["confidence"] = float(conf_text)
+                except: pass
+        if "anchor_id" in d and self.cb_anchor.currentIndex() >= 0:
+            changes["anchor_id"] = self.cb_anchor.currentData() or ""
+        if "prefilter" in d:
+            changes["prefilter"] = self.le_prefilter.text().strip()
+        if "on_fail" in d and self.cb_onfail.currentIndex() >= 0:
+            changes["on_fail"] = self.cb_onfail.currentText()
+        if "is_start" in d and len(self.selected_node_items) == 1:
+            changes["is_start"] = self.ck_start.isChecked()
+        return changes
 
     def apply_properties_to_current(self):
-        if not self.current_node_item:
+        if not self.selected_node_items:
             show_info(self, "未选中节点"); return
-        node = self.current_node_item.model
-        node.label = self.le_label.text() or node.label
-        node.image_path = self.le_image.text() or node.image_path
-        try: node.retries = int(self.sb_retries.value())
-        except: pass
-        try: node.wait_secs = float(self.ds_wait.value())
-        except: pass
-        try: node.clicks = int(self.sb_clicks.value())
-        except: pass
-        node.double_click = bool(self.ck_double.isChecked())
-        try: node.post_wait = float(self.ds_post.value())
-        except: pass
-        conf_text = self.le_conf.text().strip()
-        if conf_text == "": node.confidence = None
-        else:
-            try: node.confidence = float(conf_text)
-            except: pass
-        node.on_fail = self.cb_onfail.currentText()
-        node.is_start = bool(self.ck_start.isChecked())
-
-        if hasattr(self.current_node_item, "text"):
-            self.current_node_item.text.setText(node.label)
+        changes = self._collect_changes()
+        if not changes:
+            self.log_msg("没有修改的属性"); return
+        items = list(self.selected_node_items)
+        count = self.flow.update_nodes([it.model.id for it in items], changes)
+        if "label" in changes:
+            for it in items:
+                if hasattr(it, "text"):
+                    it.text.setText(it.model.label)
         self.update_edges_positions()
-        self.log_msg("已应用属性到节点", node.id)
+        self._dirty.clear()
+        if count == 1:
+            self.log_msg("已应用属性到节点", items[0].model.id)
+        else:
+            self.log_msg(f"已应用属性到 {count} 个节点:", ", ".join(sorted(changes)))
 
     # engine integration
     def start_engine(self):
@@ -598,7 +804,11 @@ class MainWindow(QMainWindow):
             self.log_msg("引擎已在运行"); return
         def ui_log(s):
             write_to_qtextedit(self.log, s)
-        self.engine = FlowEngine(self.flow, log_callback=ui_log)
+        if self.ck_async_engine.isChecked():
+            from async_engine import AsyncFlowEngine as engine_cls
+        else:
+            from engine import FlowEngine as engine_cls
+        self.engine = engine_cls(self.flow, log_callback=ui_log)
         def edge_cb(src, dst):
             QTimer.singleShot(0, lambda: self.animate_edge(src, dst))
         self.engine.edge_highlight_callback = edge_cb
@@ -0,0 +1,122 @@
+"""
+并行模板匹配：把屏幕帧切成互相重叠的分块，在线程池中并发 matchTemplate（OpenCV 会释放 GIL），
+按最高分合并结果；也可把多个显示器的截图作为独立区域一起并行搜索
+
+- 分块之间至少重叠一个模板大小，保证模板的任何位置都完整落在某个分块内
+- 匹配方式与 pyscreeze 一致（灰度 TM_CCOEFF_NORMED，未指定置信度时阈值 0.999）
+- 多显示器截图依赖可选的 mss；未安装时只搜索主屏
+"""
+import math
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from filecache import FileCache
+
+try:
+    import mss
+    HAS_MSS = True
+except Exception:
+    HAS_MSS = False
+
+DEFAULT_CONFIDENCE = 0.999
+
+# (帧, 左上角 x, 左上角 y)
+Region = Tuple[object, int, int]
+
+def _decode_template(path: str) -> np.ndarray:
+    data = np.fromfile(path, dtype=np.uint8)
+    tpl = cv2.imdecode(data, cv2.IMREAD_GRAYSCALE)
+    if tpl is None:
+        raise ValueError(f"无法读取模板图像: {path}")
+    return tpl
+
+
+_template_cache = FileCache(_decode_template)
+
+
+def load_template(path: str) -> np.ndarray:
+    """读取模板为灰度数组并缓存（见 filecache）；支持非 ASCII 路径"""
+    return _template_cache.get(path)
+
+
+def to_array(frame) -> np.ndarray:
+    """PIL 图像转为灰度数组；已是数组（视为灰度）则原样返回"""
+    if isinstance(frame, np.ndarray):
+        return frame
+    if frame.mode != "L":
+        frame = frame.convert("L")
+    return np.asarray(frame)
+
+
+def split_tiles(h: int, w: int, th: int, tw: int, n: int) -> List[Tuple[int, int, int, int]]:
+    """把 h×w 的区域切成约 n 块，返回 (y0, y1, x0, x1)；相邻块重叠一个模板大小"""
+    if h < th or w < tw:
+        return []
+    rows = max(1, min(n, h // (2 * th)))
+    cols = max(1, min(math.ceil(n / rows), w // (2 * tw)))
+    tiles = []
+    for r in range(rows):
+        y0 = h * r // rows
+        y1 = min(h, h * (r + 1) // rows + th)
+        for c in range(cols):
+            x0 = w * c // cols
+            x1 = min(w, w * (c + 1) // cols + tw)
+            tiles.append((y0, y1, x0, x1))
+    return tiles
+
+
+def _match_tile(hay: np.ndarray, tpl: np.ndarray, tile, ox: int, oy: int):
+    y0, y1, x0, x1 = tile
+    res = cv2.matchTemplate(hay[y0:y1, x0:x1], tpl, cv2.TM_CCOEFF_NORMED)
+    _, score, _, loc = cv2.minMaxLoc(res)
+    return score, ox + x0 + loc[0], oy + y0 + loc[1]
+
+
+class TiledMatcher:
+    def __init__(self, workers: int = 0):
+        self.workers = workers or (os.cpu_count() or 1)
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="flow-match")
+        self._local = threading.local()
+
+    def grab_monitors(self) -> List[Region]:
+        """逐个显示器截图（需要 mss），返回 [(PIL 图像, left, top), ...]"""
+        if not HAS_MSS:
+            return []
+        sct = getattr(self._local, "sct", None)
+        if sct is None:
+            sct = self._local.sct = mss.mss()
+        regions = []
+        for mon in sct.monitors[1:]:
+            shot = sct.grab(mon)
+            img = Image.frombytes("RGB", shot.size, shot.bgra, "raw", "BGRX")
+            regions.append((img, mon["left"], mon["top"]))
+        return regions
+
+    def locate(self, image_path: str, regions: List[Region], confidence: Optional[float] = None):
+        """在所有区域中并行搜索模板，返回最佳匹配中心 (x, y)；低于置信度时返回 None"""
+        tpl = load_template(image_path)
+        th, tw = tpl.shape[:2]
+        threshold = DEFAULT_CONFIDENCE if confidence is None else confidence
+        per_region = max(1, self.workers // max(1, len(regions)))
+        futures = []
+        for frame, ox, oy in regions:
+            hay = to_array(frame)
+            for tile in split_tiles(hay.shape[0], hay.shape[1], th, tw, per_region):
+                futures.append(self._pool.submit(_match_tile, hay, tpl, tile, ox, oy))
+        best = None
+        for f in futures:
+            r = f.result()
+            if best is None or r[0] > best[0]:
+                best = r
+        if best is None or best[0] < threshold:
+            return None
+        return best[1] + tw // 2, best[2] + th // 2
+
+    def close(self):
+        self._pool.shutdown(wait=False)
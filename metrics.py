@@ -0,0 +1,169 @@
+"""
+引擎指标：计数器 + 直方图，可导出为 Prometheus 文本、本地 HTTP 端点或定期快照文件
+
+更新路径无锁：每个 MetricsRegistry 只由一个引擎线程写入（单写者），
+读者（HTTP 端点 / 快照线程）只做整体拷贝；锁只在注册新直方图和启停服务时使用。
+"""
+import json
+import os
+import threading
+from bisect import bisect_left
+from typing import Dict, Tuple
+
+Labels = Tuple[Tuple[str, str], ...]
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        # 最后一格对应 +Inf
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _escape(v) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt_labels(labels: Labels, extra: Labels = ()) -> str:
+    items = tuple(labels) + tuple(extra)
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+
+class MetricsRegistry:
+    def __init__(self, prefix: str = "flow"):
+        self.prefix = prefix
+        self._counters: Dict[Tuple[str, Labels], float] = {}
+        self._hists: Dict[Tuple[str, Labels], Histogram] = {}
+        self._lock = threading.Lock()
+        self._server = None
+        self._snap_stop = None
+
+    # ---- 写入（引擎线程） ----
+    def inc(self, name: str, labels: Labels = (), value: float = 1):
+        key = (name, labels)
+        self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, labels: Labels = ()):
+        key = (name, labels)
+        h = self._hists.get(key)
+        if h is None:
+            with self._lock:
+                h = self._hists.setdefault(key, Histogram())
+        h.observe(value)
+
+    # ---- 读取 ----
+    def snapshot(self) -> dict:
+        counters = dict(self._counters)
+        hists = dict(self._hists)
+        return {
+            "counters": [
+                {"name": n, "labels": dict(l), "value": v} for (n, l), v in sorted(counters.items())
+            ],
+            "histograms": [
+                {"name": n, "labels": dict(l), "buckets": list(h.buckets), "counts": list(h.counts),
+                 "sum": h.sum, "count": h.count}
+                for (n, l), h in sorted(hists.items(), key=lambda kv: kv[0])
+            ],
+        }
+
+    def to_prometheus(self) -> str:
+        snap = self.snapshot()
+        lines = []
+        typed = set()
+        for c in snap["counters"]:
+            name = f"{self.prefix}_{c['name']}_total"
+            if name not in typed:
+                lines.append(f"# TYPE {name} counter"); typed.add(name)
+            lines.append(f"{name}{_fmt_labels(tuple(c['labels'].items()))} {c['value']}")
+        for h in snap["histograms"]:
+            name = f"{self.prefix}_{h['name']}_seconds"
+            labels = tuple(h["labels"].items())
+            if name not in typed:
+                lines.append(f"# TYPE {name} histogram"); typed.add(name)
+            cum = 0
+            for le, cnt in zip(list(h["buckets"]) + ["+Inf"], h["counts"]):
+                cum += cnt
+                lines.append(f"{name}_bucket{_fmt_labels(labels, (('le', le),))} {cum}")
+            lines.append(f"{name}_sum{_fmt_labels(labels)} {h['sum']}")
+            lines.append(f"{name}_count{_fmt_labels(labels)} {h['count']}")
+        return "\n".join(lines) + "\n"
+
+    # ---- 导出 ----
+    def serve(self, port: int = 9108, host: str = "127.0.0.1"):
+        """在本地启动 /metrics HTTP 端点（后台线程），返回 (host, port)"""
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404); return
+                body = registry.to_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        with self._lock:
+            if self._server is None:
+                self._server = ThreadingHTTPServer((host, port), Handler)
+                threading.Thread(target=self._server.serve_forever, daemon=True).start()
+            return self._server.server_address[:2]
+
+    def write_snapshot(self, path: str):
+        """写快照文件：.prom 为 Prometheus 文本（可供 textfile collector 采集），否则为 JSON"""
+        if path.endswith(".prom"):
+            text = self.to_prometheus()
+        else:
+            text = json.dumps(self.snapshot(), indent=2, ensure_ascii=False)
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp, path)
+
+    def start_snapshots(self, path: str, interval: float = 15.0):
+        """后台线程每 interval 秒写一次快照文件"""
+        with self._lock:
+            if self._snap_stop is not None:
+                return
+            stop = self._snap_stop = threading.Event()
+
+        def loop():
+            while not stop.wait(interval):
+                try:
+                    self.write_snapshot(path)
+                except Exception:
+                    pass
+            try:
+                self.write_snapshot(path)
+            except Exception:
+                pass
+
+        threading.Thread(target=loop, daemon=True).start()
+
+    def close(self):
+        with self._lock:
+            if self._server is not None:
+                self._server.shutdown(); self._server.server_close()
+                self._server = None
+            if self._snap_stop is not None:
+                self._snap_stop.set()
+                self._snap_stop = None
@@ -1,12 +1,18 @@
 """
 数据模型：NodeModel 和 FlowModel（与之前相同，JSON 可序列化）
+
+- NodeModel 使用 __slots__（Python 3.10+），大流程下每个节点不再携带 __dict__
+- FlowModel 维护前驱索引（_preds: 目标 -> 源集合），删除节点/连线的代价只与其度数相关
 """
 import json
+import sys
 import uuid
 from dataclasses import dataclass, asdict, field
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Set
 
-@dataclass
+_SLOTS = {"slots": True} if sys.version_info >= (3, 10) else {}
+
+@dataclass(**_SLOTS)
 class NodeModel:
     id: str
     label: str
@@ -21,6 +27,13 @@ class NodeModel:
     confidence: Optional[float] = None
     on_fail: str = "stop"
     is_start: bool = False
+    prefilter: str = ""
+    # 锚点：引用另一个节点的位置加偏移作为点击位置，不再匹配自己的图像
+    anchor_id: str = ""
+    offset_x: int = 0
+    offset_y: int = 0
+    # 作为锚点时，位置缓存的有效期（秒，0 表示不缓存）
+    anchor_ttl: float = 5.0
 
     def to_dict(self):
         return asdict(self)
@@ -33,6 +46,19 @@ class NodeModel:
 class FlowModel:
     nodes: Dict[str, NodeModel] = field(default_factory=dict)
     edges: Dict[str, List[str]] = field(default_factory=dict)
+    _preds: Dict[str, Set[str]] = field(default_factory=dict, init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        self._rebuild_preds()
+
+    def _rebuild_preds(self):
+        self._preds = {}
+        for src, targets in self.edges.items():
+            for dst in targets:
+                self._preds.setdefault(dst, set()).add(src)
+
+    def predecessors(self, node_id: str) -> List[str]:
+        return list(self._preds.get(node_id, ()))
 
     def add_node(self, node: NodeModel):
         self.nodes[node.id] = node
@@ -41,21 +67,41 @@ class FlowModel:
 
     def remove_node(self, node_id: str):
         self.nodes.pop(node_id, None)
-        self.edges.pop(node_id, None)
-        for src, targets in list(self.edges.items()):
-            if node_id in targets:
+        for dst in self.edges.pop(node_id, []):
+            srcs = self._preds.get(dst)
+            if srcs is not None:
+                srcs.discard(node_id)
+        for src in self._preds.pop(node_id, ()):
+            targets = self.edges.get(src)
+            if targets and node_id in targets:
                 targets.remove(node_id)
 
     def add_edge(self, src: str, dst: str):
         if src not in self.edges:
             self.edges[src] = []
-        if dst not in self.edges[src]:
+        srcs = self._preds.setdefault(dst, set())
+        if src not in srcs:
+            srcs.add(src)
             self.edges[src].append(dst)
 
     def remove_edge(self, src: str, dst: str):
-        if src in self.edges and dst in self.edges[src]:
+        srcs = self._preds.get(dst)
+        if srcs and src in srcs:
+            srcs.discard(src)
             self.edges[src].remove(dst)
 
+    def update_nodes(self, node_ids, changes: dict):
+        """批量修改多个节点的同一组字段（changes: 字段名 -> 新值），返回实际修改的节点数"""
+        count = 0
+        for nid in node_ids:
+            node = self.nodes.get(nid)
+            if node is None:
+                continue
+            for key, value in changes.items():
+                setattr(node, key, value)
+            count += 1
+        return count
+
     def to_json(self) -> str:
         data = {"nodes": {nid: node.to_dict() for nid, node in self.nodes.items()}, "edges": self.edges}
         return json.dumps(data, indent=2, ensure_ascii=False)
@@ -70,6 +116,7 @@ class FlowModel:
         for nid in fm.nodes.keys():
             if nid not in fm.edges:
                 fm.edges[nid] = []
+        fm._rebuild_preds()
         return fm
 
 def make_default_node(x=50, y=50, label_prefix="Node"):
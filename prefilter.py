@@ -0,0 +1,132 @@
+"""
+定位预过滤：在完整 matchTemplate 之前用廉价检查排除明显不可能包含模板的帧
+
+所有检查都在缩小后的帧上进行（缩小倍数随模板大小自动选择），阈值偏保守，宁可放行也不误拒：
+- color：模板的主色（量化到 8×8×8 色块）在帧中出现的像素数不足模板所需的一半时拒绝；
+  帧中落在相邻色块（每个通道 ±1 档）的像素也计入，悬停高亮或色彩配置造成的轻微偏色不会误拒
+- coarse：缩小后的模板在缩小后的帧中最高匹配分低于 COARSE_MIN_SCORE 时拒绝
+- edges：帧中任何模板大小窗口的边缘密度都不到模板边缘密度的一半时拒绝
+
+节点的 prefilter 字段为逗号分隔的检查名，如 "color,coarse"，按顺序执行，任一拒绝即停止。
+完整匹配使用灰度图，节点置信度低于默认值时可能接受颜色明显不同的画面，此时 color 检查自动跳过。
+"""
+from typing import List, Optional
+
+import cv2
+import numpy as np
+
+from filecache import FileCache
+from matcher import DEFAULT_CONFIDENCE
+
+STAGES = ("color", "coarse", "edges")
+
+COLOR_LEVELS = 8
+COLOR_COVERAGE = 0.5     # 主色需覆盖模板像素的比例
+COLOR_TOLERANCE = 0.5    # 帧中主色像素至少为模板所需的该比例
+COARSE_MIN_SCORE = 0.5
+EDGE_TOLERANCE = 0.5
+MIN_SMALL_SIDE = 8       # 缩小后模板的最短边不小于该值
+
+
+def parse_stages(text: str, confidence: Optional[float] = None) -> List[str]:
+    stages = [s.strip().lower() for s in (text or "").split(",") if s.strip()]
+    unknown = [s for s in stages if s not in STAGES]
+    if unknown:
+        raise ValueError(f"未知的预过滤检查: {', '.join(unknown)}（可选 {', '.join(STAGES)}）")
+    if confidence is not None and confidence < DEFAULT_CONFIDENCE:
+        stages = [s for s in stages if s != "color"]
+    return stages
+
+
+def _color_bins(rgb: np.ndarray) -> np.ndarray:
+    q = (rgb // (256 // COLOR_LEVELS)).astype(np.int32)
+    return (q[..., 0] * COLOR_LEVELS + q[..., 1]) * COLOR_LEVELS + q[..., 2]
+
+
+def _spread_bins(counts: np.ndarray) -> np.ndarray:
+    """每个色块的计数加上其 3×3×3 邻域内所有色块的计数"""
+    cube = np.pad(counts.reshape((COLOR_LEVELS,) * 3), 1)
+    n = COLOR_LEVELS
+    out = np.zeros((n, n, n), dtype=counts.dtype)
+    for dr in range(3):
+        for dg in range(3):
+            for db in range(3):
+                out += cube[dr:dr + n, dg:dg + n, db:db + n]
+    return out.ravel()
+
+
+def _edge_map(gray: np.ndarray) -> np.ndarray:
+    return (cv2.Canny(gray, 50, 150) > 0).astype(np.float32)
+
+
+class TemplateProfile:
+    """模板在缩小尺度下的特征，由 template_profile 缓存（见 filecache）"""
+
+    def __init__(self, path: str):
+        data = np.fromfile(path, dtype=np.uint8)
+        bgr = cv2.imdecode(data, cv2.IMREAD_COLOR)
+        if bgr is None:
+            raise ValueError(f"无法读取模板图像: {path}")
+        h, w = bgr.shape[:2]
+        self.factor = max(1, min(4, min(h, w) // MIN_SMALL_SIDE))
+        small = cv2.resize(bgr, (max(1, w // self.factor), max(1, h // self.factor)),
+                           interpolation=cv2.INTER_AREA)
+        rgb = cv2.cvtColor(small, cv2.COLOR_BGR2RGB)
+        self.gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        self.h, self.w = self.gray.shape
+
+        counts = np.bincount(_color_bins(rgb).ravel(), minlength=COLOR_LEVELS ** 3)
+        order = np.argsort(counts)[::-1]
+        total = counts.sum()
+        acc = 0
+        self.dominant = []
+        for b in order:
+            if acc >= COLOR_COVERAGE * total or counts[b] == 0:
+                break
+            self.dominant.append((int(b), int(counts[b])))
+            acc += counts[b]
+
+        self.edge_density = float(_edge_map(self.gray).mean())
+
+
+_profiles = FileCache(TemplateProfile)
+
+
+def template_profile(path: str) -> TemplateProfile:
+    return _profiles.get(path)
+
+
+def _check_color(prof: TemplateProfile, rgb: np.ndarray, gray: np.ndarray) -> bool:
+    counts = _spread_bins(np.bincount(_color_bins(rgb).ravel(), minlength=COLOR_LEVELS ** 3))
+    return all(counts[b] >= n * COLOR_TOLERANCE for b, n in prof.dominant)
+
+
+def _check_coarse(prof: TemplateProfile, rgb: np.ndarray, gray: np.ndarray) -> bool:
+    res = cv2.matchTemplate(gray, prof.gray, cv2.TM_CCOEFF_NORMED)
+    return float(res.max()) >= COARSE_MIN_SCORE
+
+
+def _check_edges(prof: TemplateProfile, rgb: np.ndarray, gray: np.ndarray) -> bool:
+    if prof.edge_density <= 0:
+        return True
+    density = cv2.boxFilter(_edge_map(gray), -1, (prof.w, prof.h), normalize=True)
+    return float(density.max()) >= prof.edge_density * EDGE_TOLERANCE
+
+
+_CHECKS = {"color": _check_color, "coarse": _check_coarse, "edges": _check_edges}
+
+
+def check_frame(image_path: str, frame, stages: List[str]) -> Optional[str]:
+    """对一帧（PIL 图像）依次执行检查，返回拒绝它的检查名；可能包含模板时返回 None"""
+    prof = template_profile(image_path)
+    small = frame.reduce(prof.factor) if prof.factor > 1 else frame
+    if small.mode != "RGB":
+        small = small.convert("RGB")
+    rgb = np.asarray(small)
+    if rgb.shape[0] < prof.h or rgb.shape[1] < prof.w:
+        return None
+    gray = cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY)
+    for stage in stages:
+        if not _CHECKS[stage](prof, rgb, gray):
+            return stage
+    return None
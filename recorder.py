@@ -0,0 +1,118 @@
+"""
+飞行记录器：在实时运行时保留最近 N 帧（默认缩小 + JPEG 压缩）及匹配结果
+
+- submit() 只把帧放入一个很小的队列，队列满时直接丢弃，不阻塞截屏/匹配循环
+- 缩放与编码在后台线程完成，结果存入定长环形缓冲区，内存占用与运行时长无关
+- 仅在失败时或调用 dump() 时写盘；输出目录含 index.json（记录缩放比例与原始尺寸），
+  可交给 replay.FrameSequence 回放
+- 默认的缩小 JPEG 帧只适合人工查看：回放时虽会放大回原始尺寸，但达不到默认置信度 0.999；
+  需要按原置信度回放时使用 lossless=True（原尺寸 PNG，每帧占用内存大得多，应相应减小 capacity）
+"""
+import io
+import json
+import os
+import queue
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+
+class FlightRecorder:
+    def __init__(self, capacity: int = 120, scale: float = 0.25, quality: int = 60,
+                 dump_dir: str = "flight_records", lossless: bool = False):
+        self.capacity = capacity
+        self.lossless = lossless
+        self.scale = 1.0 if lossless else scale
+        self.quality = quality
+        self.dump_dir = dump_dir
+        self.dropped = 0
+        self._ring = deque(maxlen=capacity)
+        self._ring_lock = threading.Lock()
+        # 最多积压 2 张原始帧，保证未编码帧的内存也有上限
+        self._queue = queue.Queue(maxsize=2)
+        self._thread = None
+
+    def _ensure_worker(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._worker, daemon=True)
+        self._thread.start()
+
+    def submit(self, frame, meta: dict):
+        """记录一帧及其匹配结果；永不阻塞"""
+        if frame is None:
+            return
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait((time.time(), frame, dict(meta)))
+        except queue.Full:
+            self.dropped += 1
+
+    def _encode(self, frame) -> bytes:
+        img = frame
+        if self.scale and self.scale < 1.0:
+            w, h = img.size
+            img = img.resize((max(1, int(w * self.scale)), max(1, int(h * self.scale))))
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        buf = io.BytesIO()
+        if self.lossless:
+            # 压缩级别取低值，后台线程编码更快
+            img.save(buf, format="PNG", compress_level=1)
+        else:
+            img.save(buf, format="JPEG", quality=self.quality)
+        return buf.getvalue()
+
+    def _worker(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                ts, frame, meta = item
+                meta["size"] = list(frame.size)
+                data = self._encode(frame)
+                with self._ring_lock:
+                    self._ring.append((ts, data, meta))
+            except Exception:
+                # 编码失败的帧直接丢弃，不影响引擎
+                self.dropped += 1
+            finally:
+                self._queue.task_done()
+
+    def flush(self, timeout: float = 2.0):
+        """等待已提交的帧编码完成（最多 timeout 秒）"""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def __len__(self):
+        return len(self._ring)
+
+    def dump(self, reason: str = "manual", directory: Optional[str] = None) -> Optional[str]:
+        """把环形缓冲区写入 <dump_dir>/<时间>_<reason>/，返回目录路径（无帧时返回 None）"""
+        self.flush()
+        with self._ring_lock:
+            records = list(self._ring)
+        if not records:
+            return None
+        stamp = time.strftime("%Y%m%d_%H%M%S", time.localtime(records[-1][0]))
+        out = directory or os.path.join(self.dump_dir, f"{stamp}_{reason}")
+        os.makedirs(out, exist_ok=True)
+        t0 = records[0][0]
+        index = []
+        for i, (ts, data, meta) in enumerate(records):
+            name = f"{i:05d}.png" if self.lossless else f"{i:05d}.jpg"
+            with open(os.path.join(out, name), "wb") as f:
+                f.write(data)
+            index.append(dict(meta, t=round(ts - t0, 3), file=name, time=ts, scale=self.scale))
+        with open(os.path.join(out, "index.json"), "w", encoding="utf-8") as f:
+            json.dump(index, f, indent=2, ensure_ascii=False)
+        return out
+
+    def close(self):
+        if self._thread and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout=2.0)
+        self._thread = None
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+回放模拟器：用录制好的帧序列代替实时屏幕运行流程（可在无头 Linux 上运行）
+
+- 帧来源：目录或 .zip 归档。若包含 index.json（[{"t": 秒, "file": 文件名}, ...]）则按其时间戳，
+  否则以文件名（去掉扩展名）作为秒数时间戳，如 0.000.png、1.250.png
+- index.json 条目带 "size": [宽, 高]（飞行记录器转储的缩小帧）时，帧在解码后放大回该尺寸，
+  坐标与模板尺寸与实时屏幕一致；放大后的帧较模糊，节点置信度可能需要适当调低
+- 点击不会真正执行，只记录到 clicks
+- 虚拟时间（默认）：wait_secs/post_wait 只推进虚拟时钟，不消耗真实时间；每次定位尝试另外推进
+  LOCATE_POLL_SECS，保证 retries=-1 且 wait_secs=0 的节点也会把帧耗尽并结束
+- run() 同步执行并返回报告：节点路径、每步的虚拟耗时 / 真实耗时、匹配耗时
+
+用法：python replay.py flow.json frames_dir_or_zip [--realtime] [--workers N]
+"""
+import io
+import json
+import os
+import sys
+import time
+import zipfile
+from bisect import bisect_right
+from typing import Callable, List, Optional, Tuple
+
+from PIL import Image
+
+from engine import FlowEngine
+from models import FlowModel, NodeModel
+
+IMAGE_EXTS = (".png", ".jpg", ".jpeg", ".bmp", ".gif")
+# 虚拟时间下每次定位尝试消耗的时间（固定值，回放结果可复现）
+LOCATE_POLL_SECS = 0.1
+
+
+class FrameSequence:
+    """按时间戳排序的帧序列，按需解码，只缓存最近一帧"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._zip = zipfile.ZipFile(path) if zipfile.is_zipfile(path) else None
+        entries = self._load_index()
+        if not entries:
+            raise ValueError(f"没有可用的帧: {path}")
+        entries.sort(key=lambda e: e[0])
+        t0 = entries[0][0]
+        self.times = [t - t0 for t, _ in entries]
+        self.files = [f for _, f in entries]
+        self._cached = (-1, None)
+
+    def _names(self) -> List[str]:
+        if self._zip is not None:
+            return [n for n in self._zip.namelist() if not n.endswith("/")]
+        return sorted(os.listdir(self.path))
+
+    def _read(self, name: str) -> bytes:
+        if self._zip is not None:
+            return self._zip.read(name)
+        with open(os.path.join(self.path, name), "rb") as f:
+            return f.read()
+
+    def _load_index(self) -> List[Tuple[float, str]]:
+        names = self._names()
+        # 文件名 -> 原始屏幕尺寸（帧被缩小录制时）
+        self._sizes = {}
+        if "index.json" in names:
+            data = json.loads(self._read("index.json").decode("utf-8"))
+            for e in data:
+                if e.get("size"):
+                    self._sizes[e["file"]] = tuple(int(v) for v in e["size"])
+            return [(float(e["t"]), e["file"]) for e in data]
+        entries = []
+        for name in names:
+            stem, ext = os.path.splitext(os.path.basename(name))
+            if ext.lower() not in IMAGE_EXTS:
+                continue
+            try:
+                entries.append((float(stem), name))
+            except ValueError:
+                raise ValueError(f"无法从文件名解析时间戳: {name}（请提供 index.json）")
+        return entries
+
+    def __len__(self):
+        return len(self.files)
+
+    @property
+    def duration(self) -> float:
+        return self.times[-1]
+
+    def index_at(self, t: float) -> int:
+        """t 时刻屏幕上显示的帧（最后一个时间戳 <= t 的帧）"""
+        return max(0, bisect_right(self.times, t) - 1)
+
+    def frame_at(self, t: float) -> Image.Image:
+        idx = self.index_at(t)
+        if self._cached[0] != idx:
+            name = self.files[idx]
+            img = Image.open(io.BytesIO(self._read(name)))
+            img.load()
+            size = self._sizes.get(name)
+            if size and img.size != size:
+                img = img.resize(size, Image.BICUBIC)
+            self._cached = (idx, img)
+        return self._cached[1]
+
+    def close(self):
+        if self._zip is not None:
+            self._zip.close()
+
+
+class ReplayEngine(FlowEngine):
+    """以帧序列作为屏幕、记录点击而不执行的 FlowEngine"""
+
+    def __init__(self, flow: FlowModel, frames: FrameSequence,
+                 log_callback: Optional[Callable[[str], None]] = None, virtual_time: bool = True, **kwargs):
+        super().__init__(flow, log_callback=log_callback, **kwargs)
+        self.frames = frames
+        self.virtual_time = virtual_time
+        self._vnow = 0.0
+        self._t_start = time.monotonic()
+        # 最后一帧至少被截取一次后才算帧耗尽，录制末尾刚出现的画面也能被匹配
+        self._saw_last = False
+        self.clicks = []
+        self.steps = []
+        self.match_secs = 0.0
+        self.match_count = 0
+
+    def _now(self) -> float:
+        if self.virtual_time:
+            return self._vnow
+        return time.monotonic() - self._t_start
+
+    def _check_exhausted(self) -> bool:
+        if self._now() > self.frames.duration and self._saw_last and not self._stop.is_set():
+            # 录制已结束，之后画面不会再变化
+            self.log("回放帧已耗尽")
+            self._stop.set()
+        return self._stop.is_set()
+
+    def _sleep(self, secs: float) -> bool:
+        if self.virtual_time:
+            self._vnow += max(0.0, secs)
+        else:
+            super()._sleep(secs)
+        return self._check_exhausted()
+
+    def _grab_frame(self):
+        t = self._now()
+        if self.frames.index_at(t) == len(self.frames) - 1:
+            self._saw_last = True
+        return self.frames.frame_at(t)
+
+    def _grab_region(self, box):
+        left, top, w, h = box
+        return self._grab_frame().crop((left, top, left + w, top + h))
+
+    def _click(self, x, y, double: bool):
+        self.clicks.append({"t": round(self._now(), 3), "x": int(x), "y": int(y), "double": bool(double)})
+
+    def _locate_center(self, image_path: str, conf: Optional[float], node: Optional[NodeModel] = None):
+        w0 = time.perf_counter()
+        try:
+            return super()._locate_center(image_path, conf, node)
+        finally:
+            self.match_secs += time.perf_counter() - w0
+            self.match_count += 1
+            if self.virtual_time:
+                self._vnow += LOCATE_POLL_SECS
+            self._check_exhausted()
+
+    def _resolve_target(self, node: NodeModel, conf: Optional[float]):
+        t0 = self._now()
+        pos = super()._resolve_target(node, conf)
+        if self.virtual_time and self._now() == t0:
+            # 未发生定位（锚点缓存命中或锚点缺失）时同样推进时钟
+            self._vnow += LOCATE_POLL_SECS
+            if self._now() > self.frames.duration:
+                self._saw_last = True
+            self._check_exhausted()
+        return pos
+
+    def _execute_node_once(self, node: NodeModel):
+        t0 = self._now(); w0 = time.perf_counter()
+        ok = super()._execute_node_once(node)
+        self.steps.append({
+            "node": node.id,
+            "label": node.label,
+            "ok": ok,
+            "t": round(t0, 3),
+            "virtual_secs": round(self._now() - t0, 3),
+            "wall_secs": round(time.perf_counter() - w0, 6),
+        })
+        return ok
+
+    def run(self) -> dict:
+        """同步执行整个流程并返回报告"""
+        self._stop.clear()
+        self._vnow = 0.0
+        self._t_start = time.monotonic()
+        self._saw_last = False
+        self.clicks.clear(); self.steps.clear()
+        self.match_secs = 0.0; self.match_count = 0
+        self.prefilter_stats.clear()
+        w0 = time.perf_counter()
+        self._run()
+        return self.report(time.perf_counter() - w0)
+
+    def report(self, wall_secs: float = 0.0) -> dict:
+        return {
+            "path": [s["node"] for s in self.steps],
+            "steps": list(self.steps),
+            "clicks": list(self.clicks),
+            "frames": len(self.frames),
+            "virtual_secs": round(self._now(), 3),
+            "wall_secs": round(wall_secs, 6),
+            "match_count": self.match_count,
+            "match_secs": round(self.match_secs, 6),
+            "prefilter": dict(self.prefilter_stats),
+        }
+
+
+def replay_flow(flow: FlowModel, frames_path: str, virtual_time: bool = True,
+                log_callback: Optional[Callable[[str], None]] = None, **engine_kwargs) -> dict:
+    frames = FrameSequence(frames_path)
+    engine = None
+    try:
+        engine = ReplayEngine(flow, frames, log_callback=log_callback, virtual_time=virtual_time,
+                              **engine_kwargs)
+        return engine.run()
+    finally:
+        if engine is not None:
+            engine.close()
+        frames.close()
+
+
+def main(argv=None):
+    argv = list(sys.argv[1:] if argv is None else argv)
+    realtime = "--realtime" in argv
+    args = [a for a in argv if a != "--realtime"]
+    workers = 0
+    if "--workers" in args:
+        i = args.index("--workers")
+        try:
+            workers = int(args[i + 1])
+        except (IndexError, ValueError):
+            print(__doc__.strip().splitlines()[-1], file=sys.stderr)
+            return 2
+        del args[i:i + 2]
+    if len(args) != 2:
+        print(__doc__.strip().splitlines()[-1], file=sys.stderr)
+        return 2
+    with open(args[0], "r", encoding="utf-8") as f:
+        flow = FlowModel.from_json(f.read())
+    report = replay_flow(flow, args[1], virtual_time=not realtime,
+                         log_callback=lambda s: print(s, file=sys.stderr), locate_workers=workers)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
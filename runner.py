@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+"""
+常驻执行器：长期运行的进程，保持截屏/点击/OpenCV 后端、已解码模板与匹配线程池处于热状态，
+通过本地 Unix socket 接收运行 / 停止 / 状态请求
+
+协议：每行一个 JSON 对象（UTF-8，以 \\n 结尾），每个请求得到一行 {"ok": true/false, ...} 响应
+- {"cmd": "run", "flow": {...} 或 "path": "flow.json", "follow": true}
+    入队一次运行，返回 run_id；follow 为 true 时随后持续推送事件行
+    {"event": "state"|"log"|"step"|"end", "run_id": ..., ...}，直到 "end"
+- {"cmd": "stop", "run_id": "..."}   停止运行中或移除排队中的运行（省略 run_id 时停止当前运行）
+- {"cmd": "status"}                  当前运行、排队列表与最近结束的运行
+运行按先进先出依次执行（同一桌面同一时间只能有一个流程在操作鼠标）。
+所有运行的指标累计到同一个 MetricsRegistry，可通过 --metrics-port / --metrics-file 导出。
+
+用法：
+  python runner.py serve [--socket PATH] [--workers N] [--metrics-port PORT] [--metrics-file PATH]
+  python runner.py run flow.json [--socket PATH] [--no-follow]
+  python runner.py stop [RUN_ID] [--socket PATH]
+  python runner.py status [--socket PATH]
+"""
+import argparse
+import json
+import os
+import queue
+import socket
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Optional
+
+from engine import FlowEngine, warm_up
+from metrics import MetricsRegistry
+from models import FlowModel
+
+
+def default_socket_path() -> str:
+    base = os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+    return os.path.join(base, f"automatic_clicker-{os.getuid()}.sock")
+
+
+class Run:
+    def __init__(self, flow: FlowModel):
+        self.id = uuid.uuid4().hex[:12]
+        self.flow = flow
+        self.state = "queued"
+        self.queued_at = time.time()
+        self.started_at = None
+        self.ended_at = None
+        self.path = []
+        self.last_ok = None
+        self.engine: Optional[FlowEngine] = None
+        self._subscribers = []
+        self._lock = threading.Lock()
+
+    def subscribe(self) -> queue.Queue:
+        q = queue.Queue()
+        with self._lock:
+            if self.state in ("done", "stopped"):
+                q.put(self._end_event())
+            else:
+                self._subscribers.append(q)
+        return q
+
+    def publish(self, event: dict):
+        event = dict(event, run_id=self.id)
+        with self._lock:
+            subs = list(self._subscribers)
+            if event["event"] == "end":
+                self._subscribers.clear()
+        for q in subs:
+            q.put(event)
+
+    def _end_event(self) -> dict:
+        return {"event": "end", "run_id": self.id, "state": self.state, "path": list(self.path),
+                "last_ok": self.last_ok}
+
+    def info(self) -> dict:
+        return {"run_id": self.id, "state": self.state, "queued_at": self.queued_at,
+                "started_at": self.started_at, "ended_at": self.ended_at,
+                "steps": len(self.path), "last_ok": self.last_ok}
+
+
+class Runner:
+    """排队并依次执行运行；所有运行共享同一进程内的热资源"""
+
+    def __init__(self, locate_workers: int = 0, log_callback=None):
+        self._log = log_callback or (lambda s: None)
+        # 运行依次执行，同一时刻只有一个引擎写入，满足单写者约定
+        self.metrics = MetricsRegistry()
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._current: Optional[Run] = None
+        self._recent = deque(maxlen=50)
+        self._matcher = None
+        errors = warm_up()
+        for e in errors:
+            self._log(f"预热失败 {e}")
+        if locate_workers > 0:
+            from engine import has_opencv
+            if has_opencv():
+                from matcher import TiledMatcher
+                self._matcher = TiledMatcher(locate_workers)
+        self._worker = threading.Thread(target=self._loop, name="flow-runner", daemon=True)
+        self._worker.start()
+
+    def submit(self, run: Run) -> Run:
+        # 预先解码本流程的模板，后续运行直接命中缓存
+        warm_up([n.image_path for n in run.flow.nodes.values() if n.image_path])
+        with self._cond:
+            self._queue.append(run)
+            self._cond.notify()
+        run.publish({"event": "state", "state": "queued"})
+        return run
+
+    def stop(self, run_id: Optional[str] = None) -> bool:
+        with self._cond:
+            cur = self._current
+            if cur is not None and run_id in (None, cur.id):
+                if cur.engine is not None:
+                    cur.engine.stop()
+                cur.state = "stopping"
+                return True
+            for run in list(self._queue):
+                if run.id == run_id:
+                    self._queue.remove(run)
+                    run.state = "stopped"
+                    run.ended_at = time.time()
+                    self._recent.append(run)
+                    run.publish(run._end_event())
+                    return True
+        return False
+
+    def status(self) -> dict:
+        with self._cond:
+            return {
+                "current": self._current.info() if self._current else None,
+                "queue": [r.info() for r in self._queue],
+                "recent": [r.info() for r in reversed(self._recent)],
+            }
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                run = self._queue.popleft()
+                self._current = run
+            try:
+                self._execute(run)
+            except Exception as e:
+                run.publish({"event": "log", "text": f"运行异常: {e!r}"})
+            finally:
+                with self._cond:
+                    if run.state != "stopping":
+                        run.state = "done"
+                    else:
+                        run.state = "stopped"
+                    run.ended_at = time.time()
+                    self._current = None
+                    self._recent.append(run)
+                run.publish(run._end_event())
+
+    def _execute(self, run: Run):
+        def on_step(node_id, ok, secs):
+            run.path.append(node_id)
+            run.last_ok = ok
+            node = run.flow.nodes.get(node_id)
+            run.publish({"event": "step", "node": node_id, "label": node.label if node else "",
+                         "ok": ok, "secs": round(secs, 4)})
+
+        engine = FlowEngine(run.flow, log_callback=lambda s: run.publish({"event": "log", "text": s}),
+                            matcher=self._matcher, metrics=self.metrics)
+        engine.step_callback = on_step
+        with self._cond:
+            if run.state == "stopping":
+                return
+            run.engine = engine
+            run.state = "running"
+            run.started_at = time.time()
+        run.publish({"event": "state", "state": "running"})
+        engine.start()
+        with self._cond:
+            # start() 会清除停止标志，期间到达的停止请求需要补发
+            if run.state == "stopping":
+                engine.stop()
+        engine.join()
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def _send(self, obj: dict):
+        self.wfile.write((json.dumps(obj, ensure_ascii=False) + "\n").encode("utf-8"))
+        self.wfile.flush()
+
+    def handle(self):
+        runner: Runner = self.server.runner
+        for raw in self.rfile:
+            try:
+                req = json.loads(raw.decode("utf-8"))
+                cmd = req.get("cmd")
+                if cmd == "run":
+                    if "flow" in req:
+                        flow = FlowModel.from_json(json.dumps(req["flow"]))
+                    else:
+                        with open(req["path"], "r", encoding="utf-8") as f:
+                            flow = FlowModel.from_json(f.read())
+                    run = Run(flow)
+                    # 先订阅再入队，避免错过事件
+                    events = run.subscribe() if req.get("follow") else None
+                    runner.submit(run)
+                    self._send({"ok": True, "run_id": run.id})
+                    if events is not None:
+                        while True:
+                            ev = events.get()
+                            self._send(ev)
+                            if ev["event"] == "end":
+                                break
+                elif cmd == "stop":
+                    self._send({"ok": runner.stop(req.get("run_id"))})
+                elif cmd == "status":
+                    self._send(dict(runner.status(), ok=True))
+                else:
+                    self._send({"ok": False, "error": f"未知命令: {cmd}"})
+            except (BrokenPipeError, ConnectionResetError):
+                return
+            except Exception as e:
+                self._send({"ok": False, "error": repr(e)})
+
+
+class RunnerServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path: str, runner: Runner):
+        if os.path.exists(path):
+            # 只清理无人监听的残留 socket，不抢占正在运行的执行器
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+                try:
+                    probe.connect(path)
+                except ConnectionRefusedError:
+                    os.unlink(path)
+                else:
+                    raise RuntimeError(f"已有 runner 在监听: {path}")
+        super().__init__(path, _Handler)
+        os.chmod(path, 0o600)
+        self.runner = runner
+
+
+def serve(path: str, locate_workers: int = 0, metrics_port: int = 0, metrics_file: str = ""):
+    log = lambda s: print(s, file=sys.stderr, flush=True)
+    runner = Runner(locate_workers=locate_workers, log_callback=log)
+    server = RunnerServer(path, runner)
+    if metrics_port:
+        host, port = runner.metrics.serve(metrics_port)
+        log(f"指标端点: http://{host}:{port}/metrics")
+    if metrics_file:
+        runner.metrics.start_snapshots(metrics_file)
+    log(f"runner 已就绪: {path}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        runner.metrics.close()
+        if os.path.exists(path):
+            os.unlink(path)
+
+
+def request(path: str, req: dict):
+    """发送一个请求，逐行产出响应与事件"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(path)
+        f = sock.makefile("rwb")
+        f.write((json.dumps(req, ensure_ascii=False) + "\n").encode("utf-8"))
+        f.flush()
+        sock.shutdown(socket.SHUT_WR)
+        for line in f:
+            yield json.loads(line.decode("utf-8"))
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="常驻流程执行器")
+    ap.add_argument("--socket", default=default_socket_path())
+    # 子命令后也可以写 --socket；未指定时不覆盖主解析器的值
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--socket", default=argparse.SUPPRESS)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p_serve = sub.add_parser("serve", parents=[common])
+    p_serve.add_argument("--workers", type=int, default=0, help="并行定位线程数（0 为单线程）")
+    p_serve.add_argument("--metrics-port", type=int, default=0, help="在本地该端口提供 /metrics（0 为不启用）")
+    p_serve.add_argument("--metrics-file", default="", help="定期写入指标快照的文件（.prom 或 JSON）")
+    p_run = sub.add_parser("run", parents=[common])
+    p_run.add_argument("flow")
+    p_run.add_argument("--no-follow", action="store_true")
+    p_stop = sub.add_parser("stop", parents=[common])
+    p_stop.add_argument("run_id", nargs="?")
+    sub.add_parser("status", parents=[common])
+    args = ap.parse_args(argv)
+
+    if args.cmd == "serve":
+        try:
+            serve(args.socket, args.workers, args.metrics_port, args.metrics_file)
+        except RuntimeError as e:
+            print(e, file=sys.stderr)
+            return 1
+        return 0
+    if args.cmd == "run":
+        req = {"cmd": "run", "path": os.path.abspath(args.flow), "follow": not args.no_follow}
+    elif args.cmd == "stop":
+        req = {"cmd": "stop", "run_id": args.run_id}
+    else:
+        req = {"cmd": "status"}
+    ok = True
+    for msg in request(args.socket, req):
+        print(json.dumps(msg, ensure_ascii=False))
+        if msg.get("ok") is False:
+            ok = False
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())